@@ -0,0 +1,42 @@
+"""Line-based chunking shared by ingestion and the retrieval benchmark.
+
+Kept free of heavy imports so the chunk spans stored in Chroma metadata
+(`start_line` / `end_line`) can be reproduced without loading a model.
+"""
+import json
+
+CHUNK_SIZE = 200
+CHUNK_OVERLAP = 50
+
+
+
+def chunk_lines(lines, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
+    chunks = []
+    step = chunk_size - overlap
+    for i in range(0, max(1, len(lines)), step):
+        chunk = lines[i:i+chunk_size]
+        if not chunk:
+            continue
+        chunks.append((i+1, i+len(chunk), "\n".join(chunk)))
+        if i + chunk_size >= len(lines):
+            break
+    return chunks
+
+
+def is_label_record(line):
+    """True if `line` is a ground-truth label record like `{"line": 441, "labels": [...]}`."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return False
+    return isinstance(record, dict) and 'line' in record and 'labels' in record
+
+
+def is_label_file(lines):
+    """True if every non-empty line is a label record (and there is at least one).
+
+    Label files carry benchmark ground truth rather than logs; ingesting them
+    would leak the label text into retrieval.
+    """
+    records = [l for l in lines if l.strip()]
+    return bool(records) and all(is_label_record(l) for l in records)
@@ -0,0 +1,416 @@
+"""Benchmark retrieval quality and cost using labelled attack lines.
+
+Usage:
+    python scripts/benchmark_retrieval.py --target-file <log file>
+    python scripts/benchmark_retrieval.py --target-file <log file> --top-k 3 --output bench.json
+    python scripts/benchmark_retrieval.py --target-file <log file> --baseline bench.json
+
+Config:
+    LOG_DATA_DIR env var (defaults to ../logData)
+    BENCH_LABELS_FILE env var (defaults to ../benchmarks/labels/auth.log)
+    BENCH_TARGET_FILE env var (required unless --target-file is given)
+
+Each line of the labels file is a JSON record such as
+`{"line": 441, "labels": ["escalate", ...], "rules": {...}}`. The line numbers
+refer to the host log the labels were produced for, which the labels file
+does not name, so the target file must be given explicitly. Labels live
+outside the log directory, and ingestion also skips any file made of label
+records, so the ground truth never ends up in the retrieval corpus.
+
+Limitation: the shipped labels (`benchmarks/labels/auth.log`, lines 439-453)
+do not match any log in `logData/`; at those lines every shipped log has CRON
+entries, not su/sudo events. Until the matching host auth log is added to
+`logData/` and ingested, the run aborts during ground-truth validation and
+produces no score.
+
+Before anything is scored, each labelled line must exist in the target file
+and, for rule families listed in `RULE_LINE_PATTERNS` (su / sudo), match that
+family's syslog pattern. Labels from other rule families are only checked
+for existence.
+
+The target file is chunked with `agents.chunking`, the same chunking the
+ingestion script uses, so a retrieved passage is relevant to a label when its
+`source_file` is the target file and its `start_line`..`end_line` range
+contains a line with that label.
+
+For each label the script runs a set of queries through
+`agents.retriever.retrieve` and reports:
+    recall@k    - fraction of the label's chunks found in the top-k results
+    MRR         - mean reciprocal rank of the first relevant chunk
+    latency     - wall-clock time per `retrieve` call (mean / p50 / p95)
+    tokens      - context tokens returned per query (tiktoken when installed)
+
+`retrieve` opens a new Chroma client and loads the embedding model on every
+call, so the latency figures include that per-call load; it usually dominates
+the query time itself.
+
+The combined score is `quality - latency_penalty`, where
+`quality = (recall@k + MRR) / 2` and `latency_penalty = latency_weight * p95_latency_s`.
+Use `--baseline` with a previous `--output` file to accept or reject a change.
+Runs are only compared when `top_k`, `latency_weight`, `target_file` and the
+query set match. When run as a script the Hugging Face hub is switched to
+offline mode, so the embedding model must already be cached locally.
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import hashlib
+import argparse
+from collections import defaultdict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.chunking import chunk_lines, is_label_file
+from agents.retriever import retrieve, CHROMA_AVAILABLE
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _ENCODING = None
+
+
+# Built-in queries per label; a --queries file replaces a label's list.
+DEFAULT_QUERIES = {
+    "attacker_change_user": [
+        "su login to another user account",
+        "user switched to root with su",
+    ],
+    "escalate": [
+        "privilege escalation to root",
+        "attacker gained root privileges",
+    ],
+    "escalated_command": [
+        "command executed with elevated privileges",
+        "commands run as root after escalation",
+    ],
+    "escalated_sudo_command": [
+        "sudo command executed as root",
+        "suspicious sudo COMMAND entries",
+    ],
+    "escalated_sudo_session": [
+        "sudo session opened for user root",
+        "pam_unix sudo session opened",
+    ],
+}
+
+# Syslog patterns a labelled line must match, keyed by rule prefix. A line is
+# checked only if one of its rules has a known prefix, and passes if any of
+# those patterns match (a line can carry rules from several families).
+RULE_LINE_PATTERNS = {
+    "attacker.escalate.su.": re.compile(r'\bsu(\[\d+\])?:'),
+    "attacker.escalate.sudo.": re.compile(r'\bsudo(\[\d+\])?:'),
+}
+
+# Report fields that must match before two runs can be compared.
+COMPARABLE_KEYS = ("top_k", "latency_weight", "target_file", "queries_sha256")
+
+
+def _read_records(labels_path):
+    with open(labels_path, 'r', encoding='utf-8') as fh:
+        return [json.loads(raw) for raw in fh if raw.strip()]
+
+
+def load_labels(labels_path):
+    """Return a mapping of label -> sorted list of labeled line numbers."""
+    label_lines = defaultdict(set)
+    for record in _read_records(labels_path):
+        for label in record.get('labels', []):
+            label_lines[label].add(int(record['line']))
+    return {label: sorted(lines) for label, lines in label_lines.items()}
+
+
+def load_line_rules(labels_path):
+    """Return a mapping of line number -> set of rule names that labelled it."""
+    line_rules = defaultdict(set)
+    for record in _read_records(labels_path):
+        for rules in (record.get('rules') or {}).values():
+            line_rules[int(record['line'])].update(rules)
+    return dict(line_rules)
+
+
+def read_lines(log_path):
+    with open(log_path, 'r', encoding='utf-8', errors='ignore') as fh:
+        return [l.rstrip() for l in fh.readlines()]
+
+
+def chunk_spans(lines):
+    """Return the (start_line, end_line) spans ingestion produces for `lines`."""
+    return [(start, end) for start, end, _ in chunk_lines(lines)]
+
+
+def check_labelled_lines(label_lines, lines, line_rules=None):
+    """Raise ValueError unless every labelled line exists and matches its rules.
+
+    Only rules with a prefix in RULE_LINE_PATTERNS are checked against the
+    line's content; other labelled lines just have to exist.
+    """
+    line_rules = line_rules or {}
+    bad = []
+    for n in sorted({n for numbers in label_lines.values() for n in numbers}):
+        if n < 1 or n > len(lines):
+            bad.append(f"line {n}: beyond end of file ({len(lines)} lines)")
+            continue
+        patterns = {pattern for prefix, pattern in RULE_LINE_PATTERNS.items()
+                    for rule in line_rules.get(n, ()) if rule.startswith(prefix)}
+        if patterns and not any(p.search(lines[n - 1]) for p in patterns):
+            bad.append(f"line {n}: {lines[n - 1][:100]}")
+    if bad:
+        raise ValueError(
+            "Labelled lines do not match their rules; wrong --target-file?\n  "
+            + "\n  ".join(bad[:5]) + (f"\n  ... and {len(bad) - 5} more" if len(bad) > 5 else "")
+        )
+
+
+def map_labels_to_chunks(label_lines, lines, line_rules=None):
+    """Return a mapping of label -> set of (start_line, end_line) chunk spans."""
+    check_labelled_lines(label_lines, lines, line_rules)
+    spans = chunk_spans(lines)
+    label_chunks = {}
+    for label, line_numbers in label_lines.items():
+        label_chunks[label] = {
+            (start, end) for start, end in spans
+            if any(start <= n <= end for n in line_numbers)
+        }
+    return label_chunks
+
+
+def load_queries(queries_path, labels):
+    """Return label -> queries, starting from DEFAULT_QUERIES.
+
+    A `queries_path` JSON file maps label -> list of queries and replaces the
+    default list for each label it names; naming a label that is not in the
+    labels file raises ValueError.
+    """
+    queries = {label: list(DEFAULT_QUERIES.get(label, [])) for label in labels}
+    if queries_path:
+        with open(queries_path, 'r', encoding='utf-8') as fh:
+            overrides = json.load(fh)
+        unknown = sorted(set(overrides) - set(queries))
+        if unknown:
+            raise ValueError(f"Unknown labels in {queries_path}: {', '.join(unknown)}")
+        for label, items in overrides.items():
+            queries[label] = list(items)
+    for label, items in queries.items():
+        if not items:
+            queries[label] = [label.replace('_', ' ')]
+    return queries
+
+
+def queries_digest(queries):
+    """Stable hash of the label -> queries mapping, for baseline comparison."""
+    canonical = json.dumps({label: list(items) for label, items in sorted(queries.items())}, sort_keys=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def count_tokens(text):
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return len(text.split())
+
+
+def _percentile(values, pct):
+    """Nearest-rank percentile (no interpolation, no banker's rounding)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = max(0, math.ceil(pct / 100.0 * len(ordered)) - 1)
+    return ordered[min(idx, len(ordered) - 1)]
+
+
+def evaluate_query(results, relevant, target_file, top_k):
+    """Return (recall@k, reciprocal rank) for one query's results."""
+    hits = set()
+    first_rank = None
+    for rank, r in enumerate(results[:top_k], 1):
+        meta = r.get('metadata', {}) or {}
+        if meta.get('source_file') != target_file:
+            continue
+        span = (int(meta.get('start_line', 0)), int(meta.get('end_line', 0)))
+        if span in relevant:
+            hits.add(span)
+            if first_rank is None:
+                first_rank = rank
+    recall = len(hits) / len(relevant) if relevant else 0.0
+    return recall, (1.0 / first_rank if first_rank else 0.0)
+
+
+def check_results(question, results, target_file, known_spans):
+    """Raise RuntimeError when results cannot be scored meaningfully.
+
+    `retrieve` returns [] on any failure (missing collection, uncached model),
+    and a report built from that would look like a genuine zero score.
+    """
+    if not results:
+        raise RuntimeError(f"retrieve() returned no results for {question!r}; check the Chroma collection and embedding model")
+    for r in results:
+        meta = r.get('metadata', {}) or {}
+        src = meta.get('source_file')
+        if is_label_file((r.get('text', '') or '').splitlines()):
+            raise RuntimeError(f"Label records from {src} are indexed in the collection; re-run ingestion to drop them")
+        if src == target_file:
+            span = (int(meta.get('start_line', 0)), int(meta.get('end_line', 0)))
+            if span not in known_spans:
+                raise RuntimeError(f"Retrieved span {span} of {src} does not match agents.chunking; re-run ingestion")
+
+
+def run_benchmark(queries, label_chunks, target_file, known_spans, top_k=5, latency_weight=0.1):
+    per_label = {}
+    all_recall, all_rr, all_latency, all_tokens = [], [], [], []
+
+    for label, label_queries in sorted(queries.items()):
+        relevant = label_chunks.get(label, set())
+        recalls, rrs = [], []
+        for question in label_queries:
+            start_time = time.perf_counter()
+            results = retrieve(question, top_k=top_k)
+            elapsed = time.perf_counter() - start_time
+            check_results(question, results, target_file, known_spans)
+
+            recall, rr = evaluate_query(results, relevant, target_file, top_k)
+            tokens = sum(count_tokens(r.get('text', '') or '') for r in results)
+            recalls.append(recall)
+            rrs.append(rr)
+            all_latency.append(elapsed)
+            all_tokens.append(tokens)
+
+        per_label[label] = {
+            "queries": len(label_queries),
+            "relevant_chunks": len(relevant),
+            f"recall@{top_k}": sum(recalls) / len(recalls),
+            "mrr": sum(rrs) / len(rrs),
+        }
+        all_recall.extend(recalls)
+        all_rr.extend(rrs)
+
+    n = len(all_latency)
+    recall_k = sum(all_recall) / n if n else 0.0
+    mrr = sum(all_rr) / n if n else 0.0
+    p95 = _percentile(all_latency, 95)
+    quality = (recall_k + mrr) / 2
+    latency_penalty = latency_weight * p95
+    return {
+        "top_k": top_k,
+        "target_file": target_file,
+        "token_counter": "tiktoken:cl100k_base" if _ENCODING is not None else "whitespace",
+        "queries": n,
+        "queries_sha256": queries_digest(queries),
+        "query_set": {label: list(items) for label, items in sorted(queries.items())},
+        f"recall@{top_k}": recall_k,
+        "mrr": mrr,
+        "latency_mean_s": sum(all_latency) / n if n else 0.0,
+        "latency_p50_s": _percentile(all_latency, 50),
+        "latency_p95_s": p95,
+        "latency_includes_model_load": True,
+        "context_tokens_mean": sum(all_tokens) / n if n else 0.0,
+        "latency_weight": latency_weight,
+        "quality_score": quality,
+        "latency_penalty": latency_penalty,
+        "combined_score": quality - latency_penalty,
+        "per_label": per_label,
+    }
+
+
+def compare_to_baseline(report, baseline, tolerance=0.0):
+    """Return True if `report` is at least as good as `baseline` on combined score.
+
+    Raises ValueError when the runs were made with different settings or query
+    sets, since their scores are then not comparable.
+    """
+    mismatched = [key for key in COMPARABLE_KEYS if report.get(key) != baseline.get(key)]
+    if mismatched:
+        details = "; ".join(f"{key}: {baseline.get(key)!r} -> {report.get(key)!r}" for key in mismatched)
+        raise ValueError(f"Baseline is not comparable ({details})")
+
+    for key in ("quality_score", "latency_penalty", "combined_score"):
+        delta = report[key] - baseline[key]
+        print(f"{key}: {report[key]:.4f} (baseline {baseline[key]:.4f}, delta {delta:+.4f})")
+    return report["combined_score"] - baseline["combined_score"] >= -tolerance
+
+
+def print_report(report):
+    top_k = report["top_k"]
+    print(f"{'label':<28}{'queries':>8}{'chunks':>8}{'recall@' + str(top_k):>11}{'mrr':>8}")
+    for label, row in report["per_label"].items():
+        print(f"{label:<28}{row['queries']:>8}{row['relevant_chunks']:>8}"
+              f"{row[f'recall@{top_k}']:>11.3f}{row['mrr']:>8.3f}")
+    print("-" * 63)
+    print(f"recall@{top_k}: {report[f'recall@{top_k}']:.3f}  MRR: {report['mrr']:.3f}")
+    print(f"latency mean/p50/p95 (s, incl. per-call model load): {report['latency_mean_s']:.3f} / "
+          f"{report['latency_p50_s']:.3f} / {report['latency_p95_s']:.3f}")
+    print(f"context tokens per query ({report['token_counter']}): {report['context_tokens_mean']:.1f}")
+    print(f"quality {report['quality_score']:.4f} - latency penalty {report['latency_penalty']:.4f} "
+          f"= combined score {report['combined_score']:.4f}")
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('HF_HUB_OFFLINE', '1')
+    os.environ.setdefault('TRANSFORMERS_OFFLINE', '1')
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--log-dir', default=os.environ.get('LOG_DATA_DIR', os.path.join(os.path.dirname(__file__), '..', 'logData')))
+    parser.add_argument('--labels', default=os.environ.get('BENCH_LABELS_FILE', os.path.join(os.path.dirname(__file__), '..', 'benchmarks', 'labels', 'auth.log')))
+    parser.add_argument('--target-file', default=os.environ.get('BENCH_TARGET_FILE'),
+                        help="Log file in --log-dir that the label line numbers refer to")
+    parser.add_argument('--queries', default=None, help="JSON file mapping label -> list of queries (replaces the defaults)")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--latency-weight', type=float, default=0.1)
+    parser.add_argument('--output', default=None, help="Write the JSON report to this path")
+    parser.add_argument('--baseline', default=None, help="Previous JSON report to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.0)
+    args = parser.parse_args()
+
+    if not args.target_file:
+        parser.error("--target-file (or BENCH_TARGET_FILE) is required")
+
+    log_dir = os.path.abspath(args.log_dir)
+    labels_path = os.path.abspath(args.labels)
+    log_path = os.path.join(log_dir, args.target_file)
+
+    for path in (labels_path, log_path):
+        if not os.path.exists(path):
+            print(f"File not found: {path}")
+            raise SystemExit(1)
+
+    label_lines = load_labels(labels_path)
+    lines = read_lines(log_path)
+
+    try:
+        queries = load_queries(args.queries, label_lines)
+        label_chunks = map_labels_to_chunks(label_lines, lines, load_line_rules(labels_path))
+    except ValueError as e:
+        print(f"Benchmark aborted: {e}")
+        raise SystemExit(1)
+
+    if not CHROMA_AVAILABLE:
+        print("ChromaDB or sentence-transformers not installed; cannot benchmark retrieval.")
+        raise SystemExit(1)
+
+    try:
+        report = run_benchmark(queries, label_chunks, args.target_file, set(chunk_spans(lines)),
+                               top_k=args.top_k, latency_weight=args.latency_weight)
+    except RuntimeError as e:
+        print(f"Benchmark aborted: {e}")
+        raise SystemExit(1)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        try:
+            accepted = compare_to_baseline(report, baseline, args.tolerance)
+        except ValueError as e:
+            print(f"Cannot compare: {e}")
+            raise SystemExit(1)
+        if not accepted:
+            print("REJECT: combined score regressed against baseline")
+            raise SystemExit(1)
+        print("ACCEPT: combined score within tolerance of baseline")
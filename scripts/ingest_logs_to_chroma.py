@@ -9,27 +9,20 @@ Config:
 
 This script is intentionally simple: it chunks by lines, embeds using
 sentence-transformers `all-MiniLM-L6-v2`, and writes to a Chroma collection
-named 'logs'.
+named 'logs'. Files made up only of JSON label records (see
+`agents.chunking.is_label_file`) are skipped so benchmark ground truth cannot
+leak into retrieval.
 """
 import os
+import sys
 import uuid
 from sentence_transformers import SentenceTransformer
 import chromadb
 import argparse
 import json
 
-
-def chunk_lines(lines, chunk_size=200, overlap=50):
-    chunks = []
-    step = chunk_size - overlap
-    for i in range(0, max(1, len(lines)), step):
-        chunk = lines[i:i+chunk_size]
-        if not chunk:
-            continue
-        chunks.append((i+1, i+len(chunk), "\n".join(chunk)))
-        if i + chunk_size >= len(lines):
-            break
-    return chunks
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from agents.chunking import chunk_lines, is_label_file
 
 
 def ingest(log_dir, persist_dir, model_name="all-MiniLM-L6-v2"):
@@ -45,9 +38,12 @@ def ingest(log_dir, persist_dir, model_name="all-MiniLM-L6-v2"):
         fpath = os.path.join(log_dir, fname)
         if not os.path.isfile(fpath):
             continue
-        print(f"Processing {fpath}")
         with open(fpath, 'r', encoding='utf-8', errors='ignore') as fh:
             lines = [l.rstrip() for l in fh.readlines()]
+        if is_label_file(lines):
+            print(f"Skipping label file {fpath}")
+            continue
+        print(f"Processing {fpath}")
 
         chunks = chunk_lines(lines)
         for start, end, text in chunks:
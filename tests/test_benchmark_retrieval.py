@@ -0,0 +1,169 @@
+"""Offline tests for the labelled retrieval benchmark (no Chroma needed)."""
+import json
+
+import pytest
+
+from agents.chunking import chunk_lines, is_label_file
+from scripts import benchmark_retrieval as bench
+
+
+def _log(n_lines, escalation_lines):
+    lines = []
+    for n in range(1, n_lines + 1):
+        if n in escalation_lines:
+            lines.append(f"Mar 23 08:30:{n % 60:02d} host sudo:      ait : TTY=pts/0 ; USER=root ; COMMAND=/bin/sh")
+        else:
+            lines.append(f"Mar 23 08:30:{n % 60:02d} host CRON[{n}]: pam_unix(cron:session): session opened")
+    return lines
+
+
+def _result(start, end, source='target.log', text='a b c'):
+    return {'id': f'{start}-{end}', 'text': text,
+            'metadata': {'source_file': source, 'start_line': start, 'end_line': end}, 'score': 0.1}
+
+
+def test_load_labels_dedupes_and_sorts(tmp_path):
+    path = tmp_path / 'auth.log'
+    path.write_text("\n".join(json.dumps(r) for r in [
+        {"line": 441, "labels": ["escalate", "escalated_sudo_command"]},
+        {"line": 439, "labels": ["escalate"]},
+        {"line": 441, "labels": ["escalate"]},
+    ]) + "\n\n")
+    assert bench.load_labels(str(path)) == {
+        "escalate": [439, 441],
+        "escalated_sudo_command": [441],
+    }
+
+
+def test_map_labels_to_chunks_uses_ingestion_spans():
+    lines = _log(400, {160, 390})
+    label_chunks = bench.map_labels_to_chunks({"a": [160], "b": [390]}, lines)
+    # Line 160 sits in the overlap of the first two chunks, 390 only in the last.
+    assert label_chunks == {"a": {(1, 200), (151, 350)}, "b": {(301, 400)}}
+    assert bench.chunk_spans(lines) == [(s, e) for s, e, _ in chunk_lines(lines)]
+
+
+def test_load_line_rules(tmp_path):
+    path = tmp_path / 'labels.jsonl'
+    path.write_text("\n".join(json.dumps(r) for r in [
+        {"line": 441, "labels": ["a", "b"], "rules": {"a": ["attacker.escalate.su.login"],
+                                                      "b": ["attacker.escalate.sudo.command"]}},
+        {"line": 500, "labels": ["c"]},
+    ]))
+    assert bench.load_line_rules(str(path)) == {
+        441: {"attacker.escalate.su.login", "attacker.escalate.sudo.command"},
+    }
+
+
+def test_map_labels_to_chunks_checks_lines_against_their_rules():
+    lines = _log(400, {160})
+    sudo = {n: {"attacker.escalate.sudo.command"} for n in (160, 161)}
+    with pytest.raises(ValueError, match="line 161"):
+        bench.map_labels_to_chunks({"a": [160, 161]}, lines, sudo)
+    # An su rule does not accept a sudo line.
+    with pytest.raises(ValueError, match="line 160"):
+        bench.map_labels_to_chunks({"a": [160]}, lines, {160: {"attacker.escalate.su.login"}})
+    # A line carrying both families passes if either pattern matches.
+    both = {160: {"attacker.escalate.su.login", "attacker.escalate.sudo.open"}}
+    assert bench.map_labels_to_chunks({"a": [160]}, lines, both) == {"a": {(1, 200), (151, 350)}}
+    with pytest.raises(ValueError, match="beyond end of file"):
+        bench.map_labels_to_chunks({"a": [401]}, lines)
+
+
+def test_map_labels_to_chunks_skips_content_check_for_other_rule_families():
+    lines = _log(400, set())
+    rules = {161: {"attacker.webshell.upload"}}
+    assert bench.map_labels_to_chunks({"a": [161]}, lines, rules) == {"a": {(1, 200), (151, 350)}}
+    assert bench.map_labels_to_chunks({"a": [161]}, lines) == {"a": {(1, 200), (151, 350)}}
+
+
+def test_load_queries_replaces_defaults_and_rejects_unknown_labels(tmp_path):
+    path = tmp_path / 'queries.json'
+    path.write_text(json.dumps({"escalate": ["custom query"]}))
+    queries = bench.load_queries(str(path), ["escalate", "escalated_sudo_command", "new_label"])
+    assert queries["escalate"] == ["custom query"]
+    assert queries["escalated_sudo_command"] == bench.DEFAULT_QUERIES["escalated_sudo_command"]
+    assert queries["new_label"] == ["new label"]
+
+    path.write_text(json.dumps({"escalate_sudo_command": ["typo"]}))
+    with pytest.raises(ValueError, match="escalate_sudo_command"):
+        bench.load_queries(str(path), ["escalate", "escalated_sudo_command"])
+
+
+def test_is_label_file():
+    assert is_label_file(['{"line": 1, "labels": ["a"]}', '', '{"line": 2, "labels": []}'])
+    assert not is_label_file([])
+    assert not is_label_file(['{"line": 1, "labels": ["a"]}', 'Mar 23 host sudo: ait'])
+    assert not is_label_file(['{"line": 1}'])
+
+
+def test_evaluate_query_recall_and_rank_cutoff():
+    relevant = {(151, 350), (301, 400)}
+    results = [_result(1, 200), _result(151, 350, source='other.log'),
+               _result(151, 350), _result(151, 350), _result(301, 400)]
+    # Duplicate hits count once; the hit at rank 5 is beyond top_k=4.
+    assert bench.evaluate_query(results, relevant, 'target.log', 4) == (0.5, 1 / 3)
+    assert bench.evaluate_query(results, relevant, 'target.log', 5) == (1.0, 1 / 3)
+    assert bench.evaluate_query(results, set(), 'target.log', 5) == (0.0, 0.0)
+
+
+def test_percentile():
+    assert bench._percentile([], 95) == 0.0
+    assert bench._percentile([3.0], 95) == 3.0
+    values = [float(v) for v in range(1, 11)]
+    assert bench._percentile(values, 50) == 5.0
+    assert bench._percentile(values, 90) == 9.0
+    assert bench._percentile(values, 95) == 10.0
+
+
+def _report(combined, **overrides):
+    report = {"top_k": 5, "latency_weight": 0.1, "target_file": "target.log",
+              "queries_sha256": bench.queries_digest({"a": ["q1"]}),
+              "quality_score": combined, "latency_penalty": 0.0, "combined_score": combined}
+    report.update(overrides)
+    return report
+
+
+def test_compare_to_baseline():
+    assert bench.compare_to_baseline(_report(0.5), _report(0.5))
+    assert not bench.compare_to_baseline(_report(0.49), _report(0.5))
+    assert bench.compare_to_baseline(_report(0.49), _report(0.5), tolerance=0.02)
+
+
+@pytest.mark.parametrize("overrides", [
+    {"top_k": 3},
+    {"latency_weight": 0.2},
+    {"target_file": "other.log"},
+    {"queries_sha256": bench.queries_digest({"a": ["q1", "q2"]})},
+])
+def test_compare_to_baseline_rejects_mismatched_runs(overrides):
+    key = next(iter(overrides))
+    with pytest.raises(ValueError, match=key):
+        bench.compare_to_baseline(_report(0.9, **overrides), _report(0.5))
+
+
+def _run(monkeypatch, results):
+    monkeypatch.setattr(bench, 'retrieve', lambda question, top_k=5: results)
+    return bench.run_benchmark({"a": ["q1", "q2"]}, {"a": {(1, 200)}}, 'target.log',
+                               {(1, 200), (151, 350)}, top_k=5)
+
+
+def test_run_benchmark_scores(monkeypatch):
+    report = _run(monkeypatch, [_result(151, 350), _result(1, 200)])
+    assert report["queries"] == 2
+    assert report["recall@5"] == 1.0
+    assert report["mrr"] == 0.5
+    assert report["per_label"]["a"]["relevant_chunks"] == 1
+    assert report["queries_sha256"] == bench.queries_digest({"a": ["q1", "q2"]})
+    assert report["combined_score"] == report["quality_score"] - report["latency_penalty"]
+
+
+@pytest.mark.parametrize("results, message", [
+    ([], "no results"),
+    ([_result(1, 12, source='labels.jsonl', text='{"line": 441, "labels": ["escalate"]}')],
+     "Label records from labels.jsonl"),
+    ([_result(1, 100)], "does not match agents.chunking"),
+])
+def test_run_benchmark_rejects_unscoreable_results(monkeypatch, results, message):
+    with pytest.raises(RuntimeError, match=message):
+        _run(monkeypatch, results)